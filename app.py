@@ -1,26 +1,91 @@
 # app.py
 import os
+import shutil
+import tempfile
+from functools import lru_cache
 from typing import List
+import numpy as np
+import torch
 from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
+from bson.binary import Binary
 from pymongo import MongoClient
-from sentence_transformers import SentenceTransformer
+from embedding_model import MODEL_NAME, EMBED_QUANTIZE, load_model
+from bson_vector import to_bson_vector
 from fastapi.middleware.cors import CORSMiddleware
 
+# optional: USE_ONNX=1 embeds queries with ONNX Runtime (pip install optimum[onnxruntime]).
+# The export is fp32, so pair it with fp32 stored vectors (EMBED_QUANTIZE off).
+USE_ONNX = os.getenv("USE_ONNX", "0") == "1"
+if USE_ONNX:
+    from optimum.onnxruntime import ORTModelForFeatureExtraction
+    from transformers import AutoTokenizer
+
 MONGODB_URI = os.environ.get("MONGODB_URI")
 if not MONGODB_URI:
     raise SystemExit("Set MONGODB_URI env var in this shell")
 
-MODEL_NAME = "all-MiniLM-L6-v2"
+ORT_MODEL_ID = f"sentence-transformers/{MODEL_NAME}"
+ORT_DIR = os.getenv("ORT_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "onnx_minilm"))
+MAX_SEQ_LENGTH = 256  # SentenceTransformer's max_seq_length for MiniLM
 INDEX_NAME = "vector_index"
 PATH = "ai_summary_embedding"
-NUM_CANDIDATES = 100
+NUM_CANDIDATES = 100       # floor; scaled to 10x limit per request
+MAX_NUM_CANDIDATES = 2000
+
+torch.set_num_threads(int(os.getenv("TORCH_NUM_THREADS", "4")))
+torch.set_num_interop_threads(1)
 
 client = MongoClient(MONGODB_URI)
 db = client["scrape_db"]
 coll = db["history_pages"]
 
-model = SentenceTransformer(MODEL_NAME)
+def load_ort_model():
+    """fp32 ONNX export of the model, reused across restarts. Exported into a temp dir and renamed
+    into place, so uvicorn workers starting together never load a half-written ORT_DIR."""
+    if not os.path.exists(ORT_DIR):
+        parent = os.path.dirname(os.path.abspath(ORT_DIR))
+        os.makedirs(parent, exist_ok=True)
+        tmp = tempfile.mkdtemp(prefix=".onnx-export-", dir=parent)
+        try:
+            ORTModelForFeatureExtraction.from_pretrained(ORT_MODEL_ID, export=True).save_pretrained(tmp)
+            AutoTokenizer.from_pretrained(ORT_MODEL_ID).save_pretrained(tmp)
+            os.rename(tmp, ORT_DIR)
+        except OSError:
+            if not os.path.exists(ORT_DIR):
+                raise
+            # another worker renamed its export into place first
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+    return AutoTokenizer.from_pretrained(ORT_DIR), ORTModelForFeatureExtraction.from_pretrained(
+        ORT_DIR, provider="CPUExecutionProvider"
+    )
+
+if USE_ONNX:
+    if EMBED_QUANTIZE:
+        raise SystemExit("USE_ONNX embeds queries in fp32; it can't be combined with EMBED_QUANTIZE=1")
+    # single-sentence queries skip the PyTorch dispatch overhead
+    tokenizer, ort_model = load_ort_model()
+    model = None
+else:
+    ort_model = None
+    model = load_model(MODEL_NAME)
+
+def encode_query(text):
+    """Embed a query string; mean-pooled and L2-normalized like the SentenceTransformer pipeline."""
+    if ort_model is None:
+        with torch.inference_mode():
+            return model.encode(text, convert_to_numpy=True, normalize_embeddings=True)
+    enc = tokenizer(text, return_tensors="np", truncation=True, max_length=MAX_SEQ_LENGTH)
+    hidden = ort_model(**enc).last_hidden_state
+    mask = enc["attention_mask"][..., None].astype(hidden.dtype)
+    vec = ((hidden * mask).sum(axis=1)[0] / max(mask.sum(), 1e-9)).astype(np.float32)
+    return vec / np.linalg.norm(vec)
+
+@lru_cache(maxsize=4096)
+def embed_query(q):
+    """Cached queryVector; callers pass a normalized (lowercased, whitespace-collapsed) string."""
+    return to_bson_vector(encode_query(q))
 
 app = FastAPI()
 app.add_middleware(
@@ -30,9 +95,15 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.on_event("startup")
+def warmup():
+    # run a few forward passes so the first real /search doesn't pay the cold-start cost
+    for _ in range(3):
+        encode_query("warmup query")
+
 class SearchRequest(BaseModel):
     query: str
-    limit: int = 10
+    limit: int = Field(10, ge=1, le=100)
     show_embedding: bool = False
 
 @app.post("/search")
@@ -40,7 +111,14 @@ def search(req: SearchRequest):
     if not req.query or not req.query.strip():
         raise HTTPException(status_code=400, detail="Empty query")
 
-    q_vec = model.encode(req.query).tolist()
+    # MiniLM is uncased, so lowercasing the cache key doesn't change the embedding
+    q_vec = embed_query(" ".join(req.query.lower().split()))
+
+    num_candidates = max(NUM_CANDIDATES, min(10 * req.limit, MAX_NUM_CANDIDATES))
+
+    project = {"title": 1, "ai_summary": 1, "vectorScore": {"$meta": "vectorSearchScore"}}
+    if req.show_embedding:
+        project["ai_summary_embedding"] = 1
 
     pipeline = [
         {
@@ -48,18 +126,11 @@ def search(req: SearchRequest):
                 "index": INDEX_NAME,
                 "queryVector": q_vec,
                 "path": PATH,
-                "numCandidates": NUM_CANDIDATES,
+                "numCandidates": num_candidates,
                 "limit": req.limit,
             }
         },
-        {
-            "$project": {
-                "title": 1,
-                "ai_summary": 1,
-                "vectorScore": {"$meta": "vectorSearchScore"},
-                "ai_summary_embedding": 1
-            }
-        }
+        {"$project": project}
     ]
 
     docs = list(coll.aggregate(pipeline))
@@ -71,7 +142,8 @@ def search(req: SearchRequest):
             "score": d.get("vectorScore"),
         }
         if req.show_embedding:
-            item["embedding"] = d.get("ai_summary_embedding")
+            emb = d.get("ai_summary_embedding")
+            item["embedding"] = emb.as_vector().data if isinstance(emb, Binary) else emb
         results.append(item)
 
     return {"results": results}
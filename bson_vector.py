@@ -0,0 +1,10 @@
+# bson_vector.py
+"""Shared packing of embeddings as BSON binData float32 vectors (pymongo>=4.10)."""
+
+from bson.binary import Binary, BinaryVectorDtype
+
+
+def to_bson_vector(vec) -> Binary:
+    """Pack a float vector (list or numpy array) as binData float32 (subtype 9) for Atlas Vector Search."""
+    values = vec.tolist() if hasattr(vec, "tolist") else list(vec)
+    return Binary.from_vector(values, BinaryVectorDtype.FLOAT32)
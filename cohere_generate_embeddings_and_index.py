@@ -3,12 +3,12 @@ cohere_generate_embeddings_and_index.py
 
 Uses direct HTTP requests to Cohere's embed endpoint (requests library) to generate embeddings,
 stores them into MongoDB (scrape_db.history_pages -> ai_summary_embedding), and creates a
-MongoDB Atlas vectorSearch (knnVector) index.
+MongoDB Atlas vectorSearch index. Embeddings are stored as BSON binData float32 vectors.
 
 This avoids client-library signature issues by calling the API directly.
 
 Requirements:
-  - pymongo
+  - pymongo>=4.10 (BSON float32 vectors)
   - requests
   - tqdm
 
@@ -20,12 +20,19 @@ Environment variables required in the same shell:
 import os
 import sys
 import time
+import random
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
 import json
 import argparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import List, Optional
 import requests
-from pymongo import MongoClient
+from requests.adapters import HTTPAdapter
+from bson.binary import Binary
+from pymongo import MongoClient, UpdateOne
 from tqdm import tqdm
+from bson_vector import to_bson_vector
 
 # -----------------------------
 # Config
@@ -38,7 +45,9 @@ EMBED_FIELD = "ai_summary_embedding"
 COHERE_MODEL = "embed-english-v3.0"   # or "embed-multilingual-v3.0"
 BATCH_SIZE = 50
 MAX_RETRIES = 3
-RETRY_WAIT_BASE = 1.0
+RETRY_WAIT_MAX = 30.0
+VECTOR_QUANTIZATION = os.environ.get("VECTOR_QUANTIZATION", "scalar")  # "none", "scalar" (int8) or "binary" (1-bit)
+MAX_WORKERS = int(os.environ.get("COHERE_MAX_WORKERS", "8"))  # concurrent embed requests
 
 # -----------------------------
 # Env
@@ -63,27 +72,47 @@ coll = db[COLLECTION_NAME]
 # -----------------------------
 COHERE_EMBED_URL = "https://api.cohere.com/v1/embed"
 
+# one keep-alive session shared by all worker threads; pool sized above MAX_WORKERS
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(pool_connections=16, pool_maxsize=16, max_retries=0))
+
+class CohereHTTPError(RuntimeError):
+    def __init__(self, status_code: int, text: str, retry_after: Optional[float] = None):
+        super().__init__(f"Cohere embed HTTP error {status_code}: {text}")
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Retry-After is either delay-seconds or an HTTP date."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
 def cohere_embed_http(texts: List[str]) -> List[List[float]]:
-    """Call Cohere embed endpoint via requests. Sends multiple possible payload keys
-    ('texts', 'inputs', 'input') to be robust to server variations. Returns list of vectors.
+    """Call Cohere embed endpoint via requests. Sends the batch once under 'texts'
+    (the v1/embed key). Returns list of vectors.
     """
     headers = {
         "Authorization": f"Bearer {COHERE_API_KEY}",
         "Content-Type": "application/json",
     }
 
-    # include multiple names to satisfy different Cohere API variants
     payload = {
         "model": COHERE_MODEL,
         "texts": texts,
-        "inputs": texts,
-        "input": texts,
-        "input_type": "text",
+        "input_type": "search_document",
     }
 
-    resp = requests.post(COHERE_EMBED_URL, headers=headers, json=payload, timeout=60)
+    resp = SESSION.post(COHERE_EMBED_URL, headers=headers, json=payload, timeout=60)
     if resp.status_code != 200:
-        raise RuntimeError(f"Cohere embed HTTP error {resp.status_code}: {resp.text}")
+        raise CohereHTTPError(resp.status_code, resp.text, parse_retry_after(resp.headers.get("Retry-After")))
 
     j = resp.json()
 
@@ -117,11 +146,21 @@ def get_embeddings_with_retries(texts: List[str]) -> List[List[float]]:
     for attempt in range(1, MAX_RETRIES + 1):
         try:
             return cohere_embed_http(texts)
+        except CohereHTTPError as e:
+            # only rate limits and server errors are worth retrying; auth/validation errors fail fast
+            if e.status_code != 429 and e.status_code < 500:
+                raise
+            last_exc = e
+            wait = e.retry_after if e.status_code == 429 and e.retry_after is not None else None
         except Exception as e:
             last_exc = e
-            wait = RETRY_WAIT_BASE ** (attempt - 1)
-            print(f"Cohere HTTP embed error (attempt {attempt}/{MAX_RETRIES}): {e}. Retrying in {wait}s...")
-            time.sleep(wait)
+            wait = None
+        if attempt == MAX_RETRIES:
+            break
+        if wait is None:
+            wait = min(RETRY_WAIT_MAX, 2 ** (attempt - 1)) + random.uniform(0, 0.5)
+        print(f"Cohere HTTP embed error (attempt {attempt}/{MAX_RETRIES}): {last_exc}. Retrying in {wait:.1f}s...")
+        time.sleep(wait)
     raise RuntimeError("Cohere embed failed after retries") from last_exc
 
 # -----------------------------
@@ -140,17 +179,24 @@ def chunkify(lst, n):
 
 def create_vector_index(dim: int):
     index_name = "vector_idx_ai_summary_cohere_http"
+    # "vector" fields index binData float32 vectors as well as arrays of doubles.
+    # With quantization Atlas keeps the in-memory graph in int8/1-bit and rescores
+    # against the full-fidelity vectors it stores on disk.
+    definition = {
+        "fields": [
+            {
+                "type": "vector",
+                "path": EMBED_FIELD,
+                "numDimensions": dim,
+                "similarity": "cosine",
+                "quantization": VECTOR_QUANTIZATION,
+            }
+        ]
+    }
     search_index = {
         "name": index_name,
-        "database": DB_NAME,
-        "collection": COLLECTION_NAME,
         "type": "vectorSearch",
-        "mappings": {
-            "dynamic": False,
-            "fields": {
-                EMBED_FIELD: {"type": "knnVector", "dimensions": dim, "similarity": "cosine"}
-            }
-        }
+        "definition": definition,
     }
     try:
         res = db.command({"createSearchIndexes": COLLECTION_NAME, "indexes": [search_index]})
@@ -158,8 +204,8 @@ def create_vector_index(dim: int):
         print(f"Vector index '{index_name}' requested/created.")
     except Exception as e:
         print("Could not create vector index programmatically:", e)
-        print("If this fails, create the index manually in Atlas UI -> Search -> Create Search Index -> JSON and paste:")
-        print(json.dumps({"mappings": {"dynamic": False, "fields": {EMBED_FIELD: {"type":"knnVector","dimensions":dim,"similarity":"cosine"}}}}, indent=2))
+        print("If this fails, create the index manually in Atlas UI -> Atlas Vector Search -> Create Index -> JSON and paste:")
+        print(json.dumps(definition, indent=2))
 
 # -----------------------------
 # Main pipeline
@@ -175,30 +221,40 @@ def main(limit: Optional[int] = None):
     print(f"Found {n_docs} docs needing embeddings. Processing in {n_batches} batches (batch size {BATCH_SIZE})...")
 
     first = True
-    # iterate with tqdm so Pylance sees tqdm is used and user sees progress
-    for batch in tqdm(chunkify(docs, BATCH_SIZE), total=n_batches, desc="Batches"):
-        texts = [doc[SUMMARY_FIELD] for doc in batch]
-        ids = [doc["_id"] for doc in batch]
-
-        vectors = get_embeddings_with_retries(texts)
-
-        # store embeddings back to MongoDB (small inner progress for the batch)
-        for _id, vec in zip(ids, vectors):
-            coll.update_one({"_id": _id}, {"$set": {EMBED_FIELD: vec}})
-
-        if first:
-            # prints which client path was used (requests or client)
-            print("Using requests-based Cohere embedding.")
-            first = False
-
-        # small pause to avoid bursting the API/DB
-        time.sleep(0.1)
+    # embed batches concurrently (HTTP-bound); MAX_WORKERS caps in-flight Cohere requests.
+    # Results are written back from this thread as each batch completes.
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as pool:
+        futures = {
+            pool.submit(get_embeddings_with_retries, [doc[SUMMARY_FIELD] for doc in batch]): batch
+            for batch in chunkify(docs, BATCH_SIZE)
+        }
+        try:
+            # iterate with tqdm so Pylance sees tqdm is used and user sees progress
+            for fut in tqdm(as_completed(futures), total=n_batches, desc="Batches"):
+                batch = futures[fut]
+                ids = [doc["_id"] for doc in batch]
+                vectors = fut.result()
+
+                # store embeddings back to MongoDB in one round-trip per batch
+                ops = [UpdateOne({"_id": _id}, {"$set": {EMBED_FIELD: to_bson_vector(vec)}}) for _id, vec in zip(ids, vectors)]
+                if ops:
+                    coll.bulk_write(ops, ordered=False)
+
+                if first:
+                    # prints which client path was used (requests or client)
+                    print("Using requests-based Cohere embedding.")
+                    first = False
+        except BaseException:
+            # don't let queued batches keep calling Cohere once one has failed
+            pool.shutdown(wait=False, cancel_futures=True)
+            raise
 
     # verify embedding dimension
     sample = coll.find_one({EMBED_FIELD: {"$exists": True}}, {EMBED_FIELD: 1})
     if not sample:
         raise RuntimeError("No embeddings saved - something went wrong.")
-    dim = len(sample[EMBED_FIELD])
+    emb = sample[EMBED_FIELD]
+    dim = len(emb.as_vector().data) if isinstance(emb, Binary) else len(emb)
     print(f"Embedding dimension detected: {dim}")
 
     create_vector_index(dim)
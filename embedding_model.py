@@ -0,0 +1,55 @@
+# embedding_model.py
+"""
+Shared loader for the local MiniLM embedding model (app.py, generate_local_embeddings.py).
+
+Runs in fp32 by default. EMBED_QUANTIZE=1 switches to fp16 weights on GPU / dynamic int8
+Linear layers on CPU; set it the same way for the job that stores vectors and for the API,
+and check the drift first:
+
+  python embedding_model.py [csv_with_ai_summary]   # cosine of fp32 vs quantized, per text
+"""
+
+import os
+import sys
+import numpy as np
+import torch
+from sentence_transformers import SentenceTransformer
+
+MODEL_NAME = "all-MiniLM-L6-v2"  # produces 384-dim vectors
+EMBED_QUANTIZE = os.getenv("EMBED_QUANTIZE", "0") == "1"
+MAX_DRIFT = 0.01  # quantized vectors should keep cosine >= 0.99 with fp32
+
+
+def load_model(name=MODEL_NAME, quantize=EMBED_QUANTIZE):
+    """fp32 unless quantize: then fp16 on GPU, dynamic int8-quantized Linear layers on CPU."""
+    if not quantize:
+        return SentenceTransformer(name)
+    if torch.cuda.is_available():
+        return SentenceTransformer(name, device="cuda", model_kwargs={"torch_dtype": torch.float16})
+    m = SentenceTransformer(name)
+    m._first_module().auto_model = torch.quantization.quantize_dynamic(
+        m._first_module().auto_model, {torch.nn.Linear}, dtype=torch.qint8
+    )
+    return m
+
+
+def quantization_drift(texts, name=MODEL_NAME):
+    """Cosine similarity between fp32 and quantized embeddings of each text."""
+    ref = load_model(name, quantize=False).encode(texts, normalize_embeddings=True, convert_to_numpy=True)
+    q = load_model(name, quantize=True).encode(texts, normalize_embeddings=True, convert_to_numpy=True)
+    return (ref.astype(np.float32) * q.astype(np.float32)).sum(axis=1)
+
+
+if __name__ == "__main__":
+    import pandas as pd
+
+    path = sys.argv[1] if len(sys.argv) > 1 else "output_with_summaries.csv"
+    texts = [t for t in pd.read_csv(path, dtype=str)["ai_summary"].fillna("") if t.strip()]
+    if not texts:
+        raise SystemExit(f"No ai_summary texts in {path}")
+    cos = quantization_drift(texts)
+    print(f"{len(texts)} texts: mean cosine {cos.mean():.4f}, min {cos.min():.4f}")
+    if cos.min() < 1 - MAX_DRIFT:
+        print(f"Drift above {MAX_DRIFT:.0%}; keep EMBED_QUANTIZE off for this data.")
+        sys.exit(1)
+    print("Drift within budget.")
@@ -1,6 +1,7 @@
 import os
 import csv
-import json
+import orjson
+from bson.binary import Binary
 from pymongo import MongoClient
 
 OUTPUT_FILE = "output_full_with_embeddings.csv"
@@ -12,17 +13,17 @@ def main():
     client = MongoClient(os.environ["MONGODB_URI"])
     coll = client["scrape_db"]["history_pages"]
 
-    # Fetch full documents
-    docs = list(coll.find({}))
+    # Pass 1: discover columns without pulling the (large) embedding arrays
+    all_keys = set()
+    for d in coll.find({}, {"ai_summary_embedding": 0}):
+        all_keys.update(d.keys())
 
-    if not docs:
+    if not all_keys:
         print("No documents found.")
         return
 
-    # Extract all keys across all documents
-    all_keys = set()
-    for d in docs:
-        all_keys.update(d.keys())
+    if coll.find_one({"ai_summary_embedding": {"$exists": True}}, {"_id": 1}):
+        all_keys.add("ai_summary_embedding")
 
     # Remove MongoDB internal _id if you don't want it
     # comment this out if you want _id included
@@ -43,18 +44,21 @@ def main():
         writer.writerow(all_keys)
 
         count = 0
-        for doc in docs:
+        # Pass 2: stream full documents straight to the CSV
+        for doc in coll.find({}).batch_size(200):
             row = []
             for key in all_keys:
                 value = doc.get(key, "")
 
-                # Convert embedding to JSON string
+                # Convert embedding to JSON string (binData float32 vectors are unpacked first)
+                if key == "ai_summary_embedding" and isinstance(value, Binary):
+                    value = value.as_vector().data
                 if key == "ai_summary_embedding" and isinstance(value, list):
-                    value = json.dumps(value)
+                    value = orjson.dumps(value).decode()
 
                 # Avoid dicts/lists being written raw
                 if isinstance(value, (dict, list)):
-                    value = json.dumps(value)
+                    value = orjson.dumps(value).decode()
 
                 row.append(value)
 
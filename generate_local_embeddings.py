@@ -1,9 +1,12 @@
-from sentence_transformers import SentenceTransformer
-from pymongo import MongoClient
+from pymongo import MongoClient, UpdateOne
 import os
+from embedding_model import MODEL_NAME, load_model
+from bson_vector import to_bson_vector
+
+BATCH_SIZE = 64
 
 # Load local embedding model (no API needed)
-model = SentenceTransformer("all-MiniLM-L6-v2")  # produces 384-dim vectors
+model = load_model(MODEL_NAME)
 
 # Connect to MongoDB Atlas
 client = MongoClient(os.environ["MONGODB_URI"])
@@ -11,12 +14,23 @@ db = client["scrape_db"]
 coll = db["history_pages"]
 
 # Process documents that have ai_summary but no embedding
-for doc in coll.find(
-    {"ai_summary": {"$exists": True}, "ai_summary_embedding": {"$exists": False}}
-).limit(100):
+docs = list(coll.find(
+    {"ai_summary": {"$exists": True}, "ai_summary_embedding": {"$exists": False}},
+    {"ai_summary": 1},
+))
 
-    vec = model.encode(doc["ai_summary"]).tolist()  # embedding
-    coll.update_one({"_id": doc["_id"]}, {"$set": {"ai_summary_embedding": vec}})
+for i in range(0, len(docs), BATCH_SIZE):
+    chunk = docs[i:i + BATCH_SIZE]
+    # encode the whole chunk in one call; SentenceTransformer sorts by length internally
+    batch_texts = [d["ai_summary"] for d in chunk]
+    vecs = model.encode(batch_texts, batch_size=BATCH_SIZE, show_progress_bar=False, normalize_embeddings=True)
 
-    print("Updated:", doc["_id"])
+    coll.bulk_write(
+        [
+            UpdateOne({"_id": d["_id"]}, {"$set": {"ai_summary_embedding": to_bson_vector(v)}})
+            for d, v in zip(chunk, vecs)
+        ],
+        ordered=False,
+    )
 
+    print(f"Updated {i + len(chunk)}/{len(docs)}")
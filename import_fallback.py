@@ -17,7 +17,8 @@ Set environment variables in .env or in your shell:
 """
 
 import os
-import json
+import orjson
+from itertools import islice
 import logging
 from pathlib import Path
 from dotenv import load_dotenv
@@ -37,14 +38,12 @@ TIMEOUT_MS = int(os.getenv("DB_TIMEOUT_MS", "10000"))
 logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
 logger = logging.getLogger("import_fallback")
 
-def load_fallback():
-    if not FALLBACK_PATH.exists():
-        logger.error("Fallback file not found: %s", FALLBACK_PATH)
-        return []
-    lines = [line for line in FALLBACK_PATH.read_text(encoding="utf-8").splitlines() if line.strip()]
-    records = [json.loads(line) for line in lines]
-    logger.info("Loaded %d fallback records from %s", len(records), FALLBACK_PATH)
-    return records
+def iter_fallback():
+    """Stream records from the fallback JSONL one line at a time."""
+    with FALLBACK_PATH.open("rb") as fh:
+        for line in fh:
+            if line.strip():
+                yield orjson.loads(line)
 
 def client_for_uri(uri, use_certifi=True):
     if not uri:
@@ -61,22 +60,27 @@ def try_import(client, records):
     col = db[COLLECTION]
     col.create_index("url", unique=True, background=True)
     ops_applied = 0
-    for i in range(0, len(records), BATCH_SIZE):
-        batch = records[i:i+BATCH_SIZE]
+    records = iter(records)
+    i = 0
+    while True:
+        batch = list(islice(records, BATCH_SIZE))
+        if not batch:
+            break
         ops = []
         for rec in batch:
             key = {"url": rec.get("url")} if rec.get("url") else {"title": rec.get("title")}
             ops.append(UpdateOne(key, {"$set": rec}, upsert=True))
-        if not ops:
-            continue
         result = col.bulk_write(ops, ordered=False)
         ops_applied += (getattr(result, "upserted_count", 0) + getattr(result, "modified_count", 0))
         logger.info("Imported batch %d-%d", i, i + len(batch) - 1)
+        i += len(batch)
     return ops_applied
 
 def main():
-    records = load_fallback()
-    if not records:
+    if not FALLBACK_PATH.exists():
+        logger.error("Fallback file not found: %s", FALLBACK_PATH)
+        return
+    if next(iter_fallback(), None) is None:
         logger.info("No fallback records to import. Exiting.")
         return
 
@@ -86,7 +90,7 @@ def main():
         try:
             client = client_for_uri(MONGO_URI)
             client.admin.command("ping")
-            applied = try_import(client, records)
+            applied = try_import(client, iter_fallback())
             logger.info("Import successful to MONGO_URI. Approx operations applied: %d", applied)
             # rename fallback file to mark imported
             FALLBACK_PATH.rename(FALLBACK_PATH.with_suffix(".imported.jsonl"))
@@ -105,7 +109,7 @@ def main():
     try:
         client_local = client_for_uri(local_uri)
         client_local.admin.command("ping")
-        applied = try_import(client_local, records)
+        applied = try_import(client_local, iter_fallback())
         logger.info("Import successful to local MongoDB. Approx operations applied: %d", applied)
         FALLBACK_PATH.rename(FALLBACK_PATH.with_suffix(".imported.jsonl"))
         logger.info("Renamed fallback file to %s", FALLBACK_PATH.with_suffix(".imported.jsonl"))
@@ -9,9 +9,10 @@ PATH = "ai_summary_embedding"     # field path
 LIMIT = 5                         # number of results to return
 NUM_CANDIDATES = 100              # tuned for approximate search (index built earlier)
 
+_MODEL = SentenceTransformer(MODEL_NAME)  # loaded once per process
+
 def make_query_vector(q_text):
-    model = SentenceTransformer(MODEL_NAME)
-    return model.encode(q_text).tolist()
+    return _MODEL.encode(q_text, normalize_embeddings=True).tolist()
 
 def main():
     if "MONGODB_URI" not in os.environ:
@@ -7,11 +7,12 @@ MODEL_NAME = "all-MiniLM-L6-v2"
 INDEX_NAME = "vector_index"
 PATH = "ai_summary_embedding"
 LIMIT = 100
-NUM_CANDIDATES = 100
+NUM_CANDIDATES = max(100, min(10 * LIMIT, 2000))  # keep the pool well above limit
+
+_MODEL = SentenceTransformer(MODEL_NAME)  # loaded once per process
 
 def make_query_vector(q_text):
-    model = SentenceTransformer(MODEL_NAME)
-    return model.encode(q_text).tolist()
+    return _MODEL.encode(q_text, normalize_embeddings=True).tolist()
 
 def main():
     if "MONGODB_URI" not in os.environ:
@@ -2,25 +2,34 @@
 """
 Scrape up to MAX_RECORDS article pages by reading the site's sitemap.
 Writes scraped_raw.csv with required columns.
-Polite delays and simple resume logic.
+Concurrent fetches with per-host polite delays and simple resume logic.
 """
 
 import os
-import time
+import atexit
+import asyncio
 import csv
+import re
 import logging
+from io import BytesIO
 from pathlib import Path
 from urllib.parse import urljoin
-from xml.etree import ElementTree as ET
 
 from dotenv import load_dotenv
-import requests
-from bs4 import BeautifulSoup
+import aiohttp
+from selectolax.parser import HTMLParser
+import lxml.etree as ET
+
+from scrape_utils import DomainLimiter, bounded_fetch, make_session, polite_wait
 
 # Selenium fallback imports
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.chrome.service import Service
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.common.exceptions import TimeoutException, WebDriverException
 from webdriver_manager.chrome import ChromeDriverManager
 
 load_dotenv()
@@ -29,36 +38,64 @@ load_dotenv()
 SITEMAP_URL = os.getenv("SITEMAP_URL", "https://www.worldhistory.org/sitemap.xml")
 START_URL = os.getenv("START_URL", "https://www.worldhistory.org/")  # fallback base
 MAX_RECORDS = int(os.getenv("MAX_RECORDS", "100"))
-DELAY = float(os.getenv("DELAY", "1.0"))
+DELAY = float(os.getenv("DELAY", "1.0"))  # min seconds between requests to the same host
+DELAY_JITTER = float(os.getenv("DELAY_JITTER", "0.5"))
+CONCURRENCY = int(os.getenv("CONCURRENCY", "8"))
 OUTPUT_CSV = os.getenv("OUTPUT_CSV", "scraped_raw.csv")
 HEADERS = {"User-Agent": "Mozilla/5.0 (compatible; MyScraper/1.0)"}
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s [sitemap-scraper] %(message)s")
 logger = logging.getLogger("sitemap-scraper")
 
+SESSION = make_session(HEADERS)
+
+# matches /article/, /articles/ and /article-...
+ARTICLE_URL_RE = re.compile(r"/article(?:-|s?/)")
+
 def requests_get(url, timeout=20):
     try:
-        r = requests.get(url, headers=HEADERS, timeout=timeout)
+        r = SESSION.get(url, timeout=timeout)
         r.raise_for_status()
         return r
     except Exception as e:
         logger.warning("requests failed for %s: %s", url, e)
         return None
 
+_DRIVER = None
+
+def _get_driver():
+    """One headless Chrome for the whole process; quit at interpreter exit."""
+    global _DRIVER
+    if _DRIVER is None:
+        options = Options()
+        options.add_argument("--headless=new")
+        options.add_argument("--no-sandbox")
+        options.add_argument("--disable-dev-shm-usage")
+        service = Service(ChromeDriverManager().install())
+        _DRIVER = webdriver.Chrome(service=service, options=options)
+        atexit.register(_DRIVER.quit)
+    return _DRIVER
+
 def fetch_with_selenium(url, wait=3):
+    polite_wait(url, DELAY, DELAY_JITTER)
     logger.info("Selenium fetching: %s", url)
-    options = Options()
-    options.add_argument("--headless=new")
-    options.add_argument("--no-sandbox")
-    options.add_argument("--disable-dev-shm-usage")
-    service = Service(ChromeDriverManager().install())
-    driver = webdriver.Chrome(service=service, options=options)
+    global _DRIVER
+    driver = _get_driver()
     try:
         driver.get(url)
-        time.sleep(wait)
-        return driver.page_source
-    finally:
-        driver.quit()
+        # driver.get() already returns at readyState "complete"; wait for the JS-rendered heading
+        WebDriverWait(driver, wait).until(EC.presence_of_element_located((By.CSS_SELECTOR, "h1")))
+    except TimeoutException:
+        pass  # use whatever has rendered so far
+    except WebDriverException:
+        # browser died; drop it so the next call starts a fresh one
+        try:
+            driver.quit()
+        except Exception:
+            pass
+        _DRIVER = None
+        raise
+    return driver.page_source
 
 def parse_sitemap(sitemap_url):
     logger.info("Downloading sitemap: %s", sitemap_url)
@@ -66,42 +103,39 @@ def parse_sitemap(sitemap_url):
     if not r:
         logger.error("Could not download sitemap")
         return []
+    urls = []
     try:
-        root = ET.fromstring(r.content)
-    except Exception as e:
+        # stream <loc> elements instead of building the whole tree; the sitemap is remote input,
+        # so no entity expansion, no network lookups and lxml's default size limits
+        for _, elem in ET.iterparse(
+            BytesIO(r.content), tag="{*}loc", resolve_entities=False, no_network=True, huge_tree=False
+        ):
+            loc = (elem.text or "").strip()
+            # keep article pages (pattern may vary); adjust ARTICLE_URL_RE if needed
+            if loc and ARTICLE_URL_RE.search(loc):
+                urls.append(loc)
+            elem.clear()
+    except ET.XMLSyntaxError as e:
         logger.error("Failed to parse sitemap xml: %s", e)
         return []
-    ns = {'ns': root.tag.split('}')[0].strip('{')} if '}' in root.tag else {}
-    urls = []
-    for url in root.findall('.//{*}loc'):
-        loc = url.text.strip()
-        # keep article pages (pattern may vary); adjust filter if needed
-        if "/article/" in loc or "/articles/" in loc or "/article-" in loc:
-            urls.append(loc)
     logger.info("Found %d candidate article URLs in sitemap", len(urls))
     return urls
 
+def _node_text(node):
+    return node.text(separator=" ", strip=True) if node is not None else ""
+
 def extract_article_fields(html, url):
-    soup = BeautifulSoup(html, "html.parser")
-    title = ""
-    if soup.select_one("h1"):
-        title = soup.select_one("h1").get_text(" ", strip=True)
-    elif soup.title:
-        title = soup.title.string.strip()
+    tree = HTMLParser(html)
+    title = _node_text(tree.css_first("h1")) or _node_text(tree.css_first("title"))
     excerpt = ""
-    meta_desc = soup.select_one("meta[name='description']")
-    if meta_desc and meta_desc.get("content"):
-        excerpt = meta_desc["content"].strip()
-    author = ""
-    a = soup.select_one(".author a")
-    if a:
-        author = a.get_text(" ", strip=True)
-    date = ""
-    t = soup.select_one("time")
-    if t:
-        date = t.get_text(" ", strip=True)
-    tags = ", ".join([x.get_text(" ", strip=True) for x in soup.select(".tags a")]) if soup.select(".tags a") else ""
-    content_length = len(soup.get_text(" ", strip=True))
+    meta_desc = tree.css_first("meta[name='description']")
+    if meta_desc is not None and meta_desc.attributes.get("content"):
+        excerpt = meta_desc.attributes["content"].strip()
+    author = _node_text(tree.css_first(".author a"))
+    date = _node_text(tree.css_first("time"))
+    tags = ", ".join([_node_text(x) for x in tree.css(".tags a")])
+    body = tree.body if tree.body is not None else tree.root
+    content_length = len(_node_text(body))
     return {
         "title": title,
         "url": url,
@@ -114,6 +148,12 @@ def extract_article_fields(html, url):
         "notes": ""
     }
 
+async def fetch_all(urls):
+    sem = asyncio.Semaphore(CONCURRENCY)
+    limiter = DomainLimiter(DELAY, DELAY_JITTER)
+    async with aiohttp.ClientSession() as session:
+        return await asyncio.gather(*[bounded_fetch(sem, limiter, session, u, HEADERS, timeout=20) for u in urls])
+
 def write_csv(rows, path: Path):
     header = ["title","url","date","author","category","excerpt","content_length","tags","notes"]
     exists = path.exists()
@@ -141,34 +181,30 @@ def main():
         # fallback: try start URL (not ideal)
         sitemap_urls = [START_URL]
 
-    # iterate and collect up to MAX_RECORDS new ones
+    # fetch concurrently in waves until MAX_RECORDS new ones are collected
+    candidates = [u for u in dict.fromkeys(sitemap_urls) if u not in existing_urls]
     collected = []
-    for u in sitemap_urls:
-        if len(collected) >= MAX_RECORDS:
-            break
-        if u in existing_urls:
-            continue
-        # fetch page
-        r = requests_get(u)
-        html = None
-        if r:
-            html = r.text
-        else:
+    pos = 0
+    while len(collected) < MAX_RECORDS and pos < len(candidates):
+        wave = candidates[pos:pos + MAX_RECORDS - len(collected)]
+        pos += len(wave)
+        htmls = asyncio.run(fetch_all(wave))
+        for u, html in zip(wave, htmls):
+            if html is None:
+                try:
+                    html = fetch_with_selenium(u)
+                except Exception as e:
+                    logger.warning("Selenium fetch failed for %s : %s", u, e)
+                    continue
+            if not html:
+                continue
             try:
-                html = fetch_with_selenium(u)
+                rec = extract_article_fields(html, u)
+                collected.append(rec)
+                existing_urls.add(u)
+                logger.info("Collected: %s", rec["title"][:80])
             except Exception as e:
-                logger.warning("Selenium fetch failed for %s : %s", u, e)
-                continue
-        if not html:
-            continue
-        try:
-            rec = extract_article_fields(html, u)
-            collected.append(rec)
-            existing_urls.add(u)
-            logger.info("Collected: %s", rec["title"][:80])
-        except Exception as e:
-            logger.warning("Failed parse for %s : %s", u, e)
-        time.sleep(DELAY)
+                logger.warning("Failed parse for %s : %s", u, e)
 
     if collected:
         write_csv(collected, out_path)
@@ -0,0 +1,139 @@
+# scrape_utils.py
+"""
+Helpers shared by scraper.py, scraper_crawl.py and scrape_from_list.py:
+per-host politeness, pooled sessions, robots.txt checks and bounded concurrent fetching.
+"""
+
+import time
+import asyncio
+import random
+import logging
+from collections import defaultdict
+from urllib.parse import urlparse
+from urllib.robotparser import RobotFileParser
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import aiohttp
+
+logger = logging.getLogger("scrape_utils")
+
+
+def make_session(headers):
+    """One keep-alive session for all synchronous fetches (reuses TCP + TLS connections)."""
+    session = requests.Session()
+    session.headers.update(headers)
+    adapter = HTTPAdapter(
+        pool_connections=20,
+        pool_maxsize=50,
+        max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[500, 502, 503, 504]),
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+_last_hit = {}
+
+
+def polite_wait(url, delay, jitter=0.0):
+    """Per-host spacing (delay + random jitter) for synchronous fetches: listing pages, browser fallbacks."""
+    netloc = urlparse(url).netloc
+    pause = delay + random.uniform(0, jitter)
+    sleep_for = pause - (time.monotonic() - _last_hit.get(netloc, float("-inf")))
+    if sleep_for > 0:
+        time.sleep(sleep_for)
+    _last_hit[netloc] = time.monotonic()
+
+
+# robots.txt per host: a RobotFileParser, or None for "allow everything"
+_robots = {}
+
+
+def _robots_url(url):
+    parsed = urlparse(url)
+    return f"{parsed.scheme or 'https'}://{parsed.netloc}/robots.txt"
+
+
+def _robots_from_response(status, text):
+    """401/403 block the host; any other non-2xx (missing file, 5xx) allows everything."""
+    if status in (401, 403):
+        rp = RobotFileParser()
+        rp.disallow_all = True
+        return rp
+    if 200 <= status < 300:
+        rp = RobotFileParser()
+        rp.parse(text.splitlines())
+        return rp
+    return None
+
+
+def robots_allowed(session, url, delay=0.0, jitter=0.0):
+    """robots.txt check through a requests session, fetched once per host and cached.
+    401/403 block the host; a missing robots.txt, 5xx or network error allows everything."""
+    netloc = urlparse(url).netloc
+    if netloc not in _robots:
+        rp = None
+        try:
+            polite_wait(url, delay, jitter)
+            r = session.get(_robots_url(url), timeout=10)
+            rp = _robots_from_response(r.status_code, r.text)
+        except Exception as e:
+            logger.debug("robots.txt unavailable for %s: %s", netloc, e)
+        _robots[netloc] = rp
+    rp = _robots[netloc]
+    return rp is None or rp.can_fetch(session.headers["User-Agent"], url)
+
+
+async def robots_allowed_async(session, url, headers, limiter):
+    """robots_allowed for aiohttp; the robots.txt fetch waits on the host's DomainLimiter like any page."""
+    netloc = urlparse(url).netloc
+    if netloc not in _robots:
+        rp = None
+        try:
+            await limiter.wait(url)
+            async with session.get(_robots_url(url), headers=headers, timeout=aiohttp.ClientTimeout(total=10)) as r:
+                rp = _robots_from_response(r.status, await r.text() if 200 <= r.status < 300 else "")
+        except Exception as e:
+            logger.debug("robots.txt unavailable for %s: %s", netloc, e)
+        _robots[netloc] = rp
+    rp = _robots[netloc]
+    return rp is None or rp.can_fetch(headers["User-Agent"], url)
+
+
+class DomainLimiter:
+    """Spaces out requests to the same host by at least min_delay (+ random jitter) seconds."""
+    def __init__(self, min_delay, jitter=0.0):
+        self.min_delay = min_delay
+        self.jitter = jitter
+        self.last = {}
+        self.locks = defaultdict(asyncio.Lock)
+
+    async def wait(self, url):
+        netloc = urlparse(url).netloc
+        async with self.locks[netloc]:
+            loop = asyncio.get_running_loop()
+            delay = self.min_delay + random.uniform(0, self.jitter)
+            sleep_for = delay - (loop.time() - self.last.get(netloc, float("-inf")))
+            if sleep_for > 0:
+                await asyncio.sleep(sleep_for)
+            self.last[netloc] = loop.time()
+
+
+async def fetch(session, url, headers, timeout=15, log_level=logging.WARNING):
+    """GET url and return the body text, or None on any error."""
+    try:
+        async with session.get(url, headers=headers, timeout=aiohttp.ClientTimeout(total=timeout)) as r:
+            r.raise_for_status()
+            return await r.text()
+    except Exception as e:
+        logger.log(log_level, "aiohttp failed for %s: %s", url, e)
+        return None
+
+
+async def bounded_fetch(sem, limiter, session, url, headers, timeout=15, log_level=logging.WARNING):
+    # politeness wait first, so a task sleeping on its host doesn't hold a concurrency slot
+    await limiter.wait(url)
+    async with sem:
+        return await fetch(session, url, headers, timeout, log_level)
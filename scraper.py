@@ -1,7 +1,8 @@
 # scraper.py
 """
 Robust scraper:
-- Uses requests+BeautifulSoup first; falls back to Selenium for JS-rendered pages.
+- Fetches article pages concurrently with aiohttp (bounded by CONCURRENCY);
+  falls back to headless Chromium (Playwright) for JS-rendered pages.
 - If urls.txt exists (one URL per line) it will parse those pages directly.
 - Writes OUTPUT_CSV with columns:
   title,url,date,author,category,excerpt,content_length,tags,notes
@@ -9,41 +10,54 @@ Config via .env or environment variables.
 """
 
 import os
-import time
+import atexit
+import asyncio
 import csv
 import logging
 from pathlib import Path
 from urllib.parse import urljoin
 
 from dotenv import load_dotenv
-import requests
+import aiohttp
 from bs4 import BeautifulSoup
+import soupsieve as sv
 
-# Selenium imports
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.chrome.service import Service
-from webdriver_manager.chrome import ChromeDriverManager
+from scrape_utils import DomainLimiter, bounded_fetch, make_session, polite_wait, robots_allowed
+
+# JS-rendering fallback (pip install playwright && playwright install chromium)
+from playwright.sync_api import sync_playwright, Error as PlaywrightError
 
 # Load env
 load_dotenv()
 
 START_URL = os.getenv("START_URL", "https://www.worldhistory.org/articles/")
 MAX_RECORDS = int(os.getenv("MAX_RECORDS", "100"))
-DELAY = float(os.getenv("DELAY", "1.0"))
+DELAY = float(os.getenv("DELAY", "1.0"))  # min seconds between requests to the same host
+DELAY_JITTER = float(os.getenv("DELAY_JITTER", "0.5"))
+CONCURRENCY = int(os.getenv("CONCURRENCY", "10"))
 OUTPUT_CSV = os.getenv("OUTPUT_CSV", "scraped_raw.csv")
 HEADERS = {"User-Agent": "Mozilla/5.0 (compatible; MyScraper/1.0)"}
 
 # Listing selector tuned for worldhistory.org; change if scraping another site.
 LISTING_LINK_SELECTOR = os.getenv("LISTING_LINK_SELECTOR", "a.title")
 
+# article field selectors, compiled once instead of per select_one call
+_SEL_TITLE = [sv.compile(s) for s in ["h1", ".entry-title", ".article-title"]]
+_SEL_EXCERPT = [sv.compile(s) for s in ["meta[name='description']", ".summary", ".excerpt"]]
+_SEL_AUTHOR = [sv.compile(s) for s in [".author a", ".byline", "meta[name='author']"]]
+_SEL_DATE = [sv.compile(s) for s in ["time", ".date", ".published"]]
+_SEL_TAGS = sv.compile(".tags a")
+
 logging.basicConfig(level=logging.INFO, format="%(asctime)s [scraper] %(message)s")
 logger = logging.getLogger("scraper")
 
+SESSION = make_session(HEADERS)
+
 
 def requests_get(url, timeout=15):
+    polite_wait(url, DELAY, DELAY_JITTER)
     try:
-        r = requests.get(url, headers=HEADERS, timeout=timeout)
+        r = SESSION.get(url, timeout=timeout)
         r.raise_for_status()
         return r
     except Exception as e:
@@ -51,82 +65,129 @@ def requests_get(url, timeout=15):
         return None
 
 
+def allowed(url):
+    """Cached robots.txt check; the robots.txt fetch gets the same per-host spacing as pages."""
+    return robots_allowed(SESSION, url, DELAY, DELAY_JITTER)
+
+
+async def fetch_all(urls):
+    """Fetch urls concurrently over one pooled session; returns html (or None) per url, in order."""
+    sem = asyncio.Semaphore(CONCURRENCY)
+    limiter = DomainLimiter(DELAY, DELAY_JITTER)
+    connector = aiohttp.TCPConnector(limit=10, limit_per_host=4, keepalive_timeout=30)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        tasks = [bounded_fetch(sem, limiter, session, u, HEADERS) for u in urls]
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+    return [r if isinstance(r, str) else None for r in results]
+
+
 def fetch_soup_requests(url):
     r = requests_get(url)
     if not r:
         return None
-    return BeautifulSoup(r.text, "html.parser")
-
-
-def fetch_soup_selenium(url, wait_seconds=3):
-    logger.info("Using Selenium to fetch: %s", url)
-    options = Options()
-    options.add_argument("--headless=new")
-    options.add_argument("--disable-gpu")
-    options.add_argument("--no-sandbox")
-    options.add_argument("--disable-dev-shm-usage")
-    service = Service(ChromeDriverManager().install())
-    driver = webdriver.Chrome(service=service, options=options)
+    return BeautifulSoup(r.text, "lxml")
+
+
+_PW = None
+_BROWSER = None
+_CONTEXT = None
+
+
+def _get_context():
+    """One headless Chromium + browser context shared by every JS fallback; closed at exit."""
+    global _PW, _BROWSER, _CONTEXT
+    if _CONTEXT is None:
+        if _PW is None:
+            _PW = sync_playwright().start()
+            atexit.register(_close_browser)
+        _BROWSER = _PW.chromium.launch(headless=True, args=["--disable-gpu", "--no-sandbox"])
+        _CONTEXT = _BROWSER.new_context(user_agent=HEADERS["User-Agent"])
+    return _CONTEXT
+
+
+def _close_browser():
+    if _BROWSER is not None:
+        _BROWSER.close()
+    if _PW is not None:
+        _PW.stop()
+
+
+def fetch_soup_js(url, timeout_ms=15000):
+    polite_wait(url, DELAY, DELAY_JITTER)
+    logger.info("Using headless Chromium to fetch: %s", url)
+    page = None
     try:
-        driver.get(url)
-        time.sleep(wait_seconds)
-        html = driver.page_source
-        return BeautifulSoup(html, "html.parser")
+        # inside the try: a missing browser install is just another failed fetch
+        page = _get_context().new_page()
+        page.goto(url, wait_until="networkidle", timeout=timeout_ms)
+        return BeautifulSoup(page.content(), "lxml")
+    except PlaywrightError as e:
+        logger.warning("Chromium fetch failed for %s: %s", url, e)
+        return None
     finally:
-        driver.quit()
+        if page is not None:
+            page.close()
+
+
+def _collect_listing_links(soup, url, seen, links):
+    for a in soup.select(LISTING_LINK_SELECTOR):
+        href = a.get("href")
+        if not href:
+            continue
+        full = urljoin(url, href)
+        if full not in seen:
+            seen.add(full)
+            # robots-blocked links must not count toward the MAX_RECORDS cap
+            if not allowed(full):
+                continue
+            links.append(full)
+            if len(links) >= MAX_RECORDS:
+                return
 
 
 def extract_links_from_listing(url):
-    """Try requests then selenium to extract article links."""
-    soup = fetch_soup_requests(url)
+    """Try requests then headless Chromium to extract robots-allowed article links (deduped, capped at MAX_RECORDS)."""
+    seen = set()
     links = []
+    soup = fetch_soup_requests(url)
     if soup:
-        for a in soup.select(LISTING_LINK_SELECTOR):
-            href = a.get("href")
-            if href:
-                links.append(urljoin(url, href))
+        _collect_listing_links(soup, url, seen, links)
     if not links:
-        soup = fetch_soup_selenium(url)
+        soup = fetch_soup_js(url)
         if soup:
-            for a in soup.select(LISTING_LINK_SELECTOR):
-                href = a.get("href")
-                if href:
-                    links.append(urljoin(url, href))
-    links = list(dict.fromkeys(links))  # dedupe
+            _collect_listing_links(soup, url, seen, links)
     logger.info("Found %d candidate links", len(links))
     return links
 
 
 def extract_text_with_selectors(soup, selectors):
+    """selectors: precompiled soupsieve patterns, tried in order."""
     for sel in selectors:
-        if sel.startswith("meta"):
-            el = soup.select_one(sel)
-            if el and el.get("content"):
-                return el.get("content").strip()
-            continue
-        el = soup.select_one(sel)
+        el = sel.select_one(soup)
         if el:
-            if el.name == "meta" and el.get("content"):
-                return el.get("content").strip()
+            if el.name == "meta":
+                if el.get("content"):
+                    return el.get("content").strip()
+                continue
             return el.get_text(" ", strip=True)
     return ""
 
 
-def parse_article(url):
+def parse_article(url, html=None):
     logger.info("Parsing %s", url)
-    soup = fetch_soup_requests(url)
+    soup = BeautifulSoup(html, "lxml") if html else None
     if not soup:
-        soup = fetch_soup_selenium(url)
+        soup = fetch_soup_js(url)
     if not soup:
         logger.warning("Could not fetch %s", url)
         return None
 
-    title = extract_text_with_selectors(soup, ["h1", ".entry-title", ".article-title"]) or ""
-    excerpt = extract_text_with_selectors(soup, ["meta[name='description']", ".summary", ".excerpt"]) or ""
-    author = extract_text_with_selectors(soup, [".author a", ".byline", "meta[name='author']"]) or ""
-    date = extract_text_with_selectors(soup, ["time", ".date", ".published"]) or ""
-    tags = ", ".join([t.get_text(strip=True) for t in soup.select(".tags a")]) if soup.select(".tags a") else ""
-    content_length = len(soup.get_text(" ", strip=True))
+    title = extract_text_with_selectors(soup, _SEL_TITLE) or ""
+    excerpt = extract_text_with_selectors(soup, _SEL_EXCERPT) or ""
+    author = extract_text_with_selectors(soup, _SEL_AUTHOR) or ""
+    date = extract_text_with_selectors(soup, _SEL_DATE) or ""
+    tags = ", ".join([t.get_text(strip=True) for t in _SEL_TAGS.select(soup)])
+    content_length = sum(len(t) for t in soup.stripped_strings)  # no joined copy of the page text
 
     return {
         "title": title,
@@ -148,6 +209,7 @@ def main():
         logger.info("Found urls.txt — will parse listed URLs")
         with urls_txt.open("r", encoding="utf-8") as fh:
             links = [l.strip() for l in fh if l.strip()]
+        links = [l for l in links if allowed(l)][:MAX_RECORDS]
     else:
         links = extract_links_from_listing(START_URL)
 
@@ -158,14 +220,13 @@ def main():
         Path(OUTPUT_CSV).write_text(",".join(header) + "\n", encoding="utf-8")
         return
 
-    links = links[:MAX_RECORDS]
+    htmls = asyncio.run(fetch_all(links))
     rows = []
-    for i, link in enumerate(links, 1):
+    for i, (link, html) in enumerate(zip(links, htmls), 1):
         logger.info("(%d/%d) %s", i, len(links), link)
-        item = parse_article(link)
+        item = parse_article(link, html)
         if item:
             rows.append(item)
-        time.sleep(DELAY)
 
     header = ["title", "url", "date", "author", "category", "excerpt", "content_length", "tags", "notes"]
     with open(OUTPUT_CSV, "w", encoding="utf-8", newline="") as f:
@@ -1,68 +1,84 @@
 # scraper_crawl.py
 """
 Crawl a site (BFS) to discover article pages and scrape them.
+Each BFS wave fetches up to CONCURRENCY pages concurrently with aiohttp.
 Writes/append to scraped_raw.csv. Config via .env or env vars.
 """
 
 import os
-import time
+import asyncio
 import csv
 import logging
+import hashlib
+import re
 from collections import deque
 from urllib.parse import urljoin, urlparse
 from pathlib import Path
 
 from dotenv import load_dotenv
-import requests
+import aiohttp
 from bs4 import BeautifulSoup
 
-# Selenium fallback
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.chrome.service import Service
-from webdriver_manager.chrome import ChromeDriverManager
+from scrape_utils import DomainLimiter, bounded_fetch, robots_allowed_async
+
+# JS-rendering fallback (pip install playwright && playwright install chromium)
+from playwright.async_api import async_playwright
 
 load_dotenv()
 
 START_URL = os.getenv("START_URL", "https://www.worldhistory.org/")
 MAX_RECORDS = int(os.getenv("MAX_RECORDS", "100"))
-DELAY = float(os.getenv("DELAY", "1.0"))
+DELAY = float(os.getenv("DELAY", "1.0"))  # min seconds between requests to the same host
+DELAY_JITTER = float(os.getenv("DELAY_JITTER", "0.5"))
 OUTPUT_CSV = os.getenv("OUTPUT_CSV", "scraped_raw.csv")
 HEADERS = {"User-Agent": "Mozilla/5.0 (compatible; MyCrawler/1.0; +https://example.com)"}
 MAX_PAGES_TO_VISIT = int(os.getenv("MAX_PAGES_TO_VISIT", "2000"))
+CONCURRENCY = int(os.getenv("CONCURRENCY", "10"))
+JS_CONCURRENCY = int(os.getenv("JS_CONCURRENCY", "2"))  # open browser pages at once
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s [crawler] %(message)s")
 logger = logging.getLogger("crawler")
 
-def requests_get(url, timeout=15):
-    try:
-        r = requests.get(url, headers=HEADERS, timeout=timeout)
-        r.raise_for_status()
-        return r
-    except Exception as e:
-        logger.debug("requests failed for %s : %s", url, e)
-        return None
+_DIGITS_RE = re.compile(r"\d+")
+# matches /article/, /articles/ and /article-... in a URL path
+_ARTICLE_RE = re.compile(r"/article(?:-|s?/)", re.I)
 
-def fetch_with_selenium(url, wait=3):
-    logger.info("Selenium fallback for %s", url)
-    opts = Options()
-    opts.add_argument("--headless=new")
-    opts.add_argument("--no-sandbox")
-    opts.add_argument("--disable-dev-shm-usage")
-    service = Service(ChromeDriverManager().install())
-    driver = webdriver.Chrome(service=service, options=opts)
-    try:
-        driver.get(url)
-        time.sleep(wait)
-        return driver.page_source
-    finally:
-        driver.quit()
+class JSFetcher:
+    """One headless Chromium + context for the crawl; pages are opened per URL and closed after.
+    Page loads go through the same DomainLimiter as the aiohttp fetches."""
+    def __init__(self, concurrency, limiter):
+        self.sem = asyncio.Semaphore(concurrency)
+        self.limiter = limiter
+        self.lock = asyncio.Lock()
+        self.pw = None
+        self.browser = None
+        self.ctx = None
 
-def is_internal(url, base_netloc):
-    try:
-        return urlparse(url).netloc == "" or urlparse(url).netloc == base_netloc
-    except Exception:
-        return False
+    async def fetch(self, url, timeout_ms=15000):
+        async with self.sem:
+            async with self.lock:
+                if self.ctx is None:
+                    if self.pw is None:
+                        self.pw = await async_playwright().start()
+                    self.browser = await self.pw.chromium.launch(headless=True, args=["--disable-gpu", "--no-sandbox"])
+                    self.ctx = await self.browser.new_context(user_agent=HEADERS["User-Agent"])
+            await self.limiter.wait(url)
+            logger.info("Headless Chromium fallback for %s", url)
+            page = await self.ctx.new_page()
+            try:
+                await page.goto(url, wait_until="networkidle", timeout=timeout_ms)
+                return await page.content()
+            finally:
+                await page.close()
+
+    async def close(self):
+        if self.browser is not None:
+            await self.browser.close()
+        if self.pw is not None:
+            await self.pw.stop()
+
+def is_internal(netloc, base_netloc):
+    return netloc == "" or netloc == base_netloc
 
 def normalize_url(href, base):
     if not href:
@@ -70,17 +86,25 @@ def normalize_url(href, base):
     return urljoin(base, href.split("#")[0]).rstrip("/")
 
 def extract_links(html, base):
-    soup = BeautifulSoup(html, "html.parser")
-    links = []
+    """Yield each distinct normalized link on the page once."""
+    soup = BeautifulSoup(html, "lxml")
+    seen = set()
     for a in soup.find_all("a", href=True):
         href = a.get("href").strip()
         full = normalize_url(href, base)
-        if full:
-            links.append(full)
-    return links
+        if full and full not in seen:
+            seen.add(full)
+            yield full
 
-def parse_article(html, url):
-    soup = BeautifulSoup(html, "html.parser")
+def content_digest(soup):
+    """Digest of the page text with digits (dates, counters, ids) stripped, for duplicate detection."""
+    h = hashlib.blake2b(digest_size=16)
+    for t in soup.stripped_strings:
+        h.update(_DIGITS_RE.sub("", t).encode("utf-8"))
+        h.update(b" ")
+    return h.digest()
+
+def parse_article(soup, url):
     title = ""
     if soup.select_one("h1"):
         title = soup.select_one("h1").get_text(" ", strip=True)
@@ -99,7 +123,7 @@ def parse_article(html, url):
     if t:
         date = t.get_text(" ", strip=True)
     tags = ", ".join([x.get_text(" ", strip=True) for x in soup.select(".tags a")]) if soup.select(".tags a") else ""
-    content_length = len(soup.get_text(" ", strip=True))
+    content_length = sum(len(t) for t in soup.stripped_strings)  # no joined copy of the page text
     return {
         "title": title,
         "url": url,
@@ -122,7 +146,7 @@ def append_csv(rows, path: Path):
         for r in rows:
             w.writerow(r)
 
-def main():
+async def crawl():
     base = START_URL
     base_netloc = urlparse(base).netloc
     out_path = Path(OUTPUT_CSV)
@@ -140,57 +164,88 @@ def main():
             pass
 
     q = deque([base])
+    enqueued = {base.rstrip("/")}  # dedup at enqueue time so the queue never holds repeats
+    seen_digests = set()  # 16-byte content digests of collected articles
     pages_visited = 0
     scraped_rows = []
 
-    while q and len(articles) < MAX_RECORDS and pages_visited < MAX_PAGES_TO_VISIT:
-        url = q.popleft()
-        if url in visited:
-            continue
-        visited.add(url)
-        pages_visited += 1
-        logger.info("Visiting (%d) %s", pages_visited, url)
-
-        r = requests_get(url)
-        html = None
-        if r:
-            html = r.text
-        else:
-            try:
-                html = fetch_with_selenium(url)
-            except Exception as e:
-                logger.warning("Selenium fetch failed for %s : %s", url, e)
-                continue
-
-        if not html:
-            continue
-
-        # find links and queue internal ones
-        for link in extract_links(html, url):
-            if not is_internal(link, base_netloc):
-                continue
-            normalized = link.rstrip("/")
-            if normalized not in visited:
-                q.append(normalized)
-
-        # If URL looks like an article page, parse & save
-        lower = url.lower()
-        if "/article" in lower or "/articles" in lower or "/article-" in lower:
-            norm = url.rstrip("/")
-            if norm not in articles:
-                try:
-                    row = parse_article(html, url)
-                    scraped_rows.append(row)
-                    articles.add(norm)
-                    logger.info("Collected article: %s", row["title"][:120])
-                except Exception as e:
-                    logger.warning("Failed parse article %s : %s", url, e)
-        time.sleep(DELAY)
-
-        # Save periodically to disk (every 10 found)
-        if len(scraped_rows) >= 10:
-            append_csv(scraped_rows, out_path)
-            scraped_rows = []
+    sem = asyncio.Semaphore(CONCURRENCY)
+    limiter = DomainLimiter(DELAY, DELAY_JITTER)
+    connector = aiohttp.TCPConnector(limit=10, limit_per_host=4, keepalive_timeout=30)
+    js = JSFetcher(JS_CONCURRENCY, limiter)
+    try:
+        async with aiohttp.ClientSession(connector=connector) as session:
+            # the start page is fetched like any discovered link, so check it too
+            if not await robots_allowed_async(session, base, HEADERS, limiter):
+                logger.error("START_URL %s is disallowed by robots.txt", base)
+                q.clear()
+            while q and len(articles) < MAX_RECORDS and pages_visited < MAX_PAGES_TO_VISIT:
+                # take the next wave of unvisited URLs off the queue
+                wave = []
+                while q and len(wave) < min(CONCURRENCY, MAX_PAGES_TO_VISIT - pages_visited):
+                    url = q.popleft()
+                    if url in visited:
+                        continue
+                    visited.add(url)
+                    wave.append(url)
+                if not wave:
+                    break
+
+                results = await asyncio.gather(*[bounded_fetch(sem, limiter, session, u, HEADERS, log_level=logging.DEBUG) for u in wave], return_exceptions=True)
+                results = [r if isinstance(r, str) and r.strip() else None for r in results]
+
+                # render the failures (JS-only / empty bodies) in the shared browser
+                failed = [i for i, r in enumerate(results) if r is None]
+                rendered = await asyncio.gather(*[js.fetch(wave[i]) for i in failed], return_exceptions=True)
+                for i, r in zip(failed, rendered):
+                    if isinstance(r, Exception):
+                        logger.warning("Chromium fetch failed for %s : %s", wave[i], r)
+                    else:
+                        results[i] = r
+
+                for url, html in zip(wave, results):
+                    pages_visited += 1
+                    logger.info("Visiting (%d) %s", pages_visited, url)
+
+                    if not html:
+                        continue
+
+                    # find links and queue internal ones
+                    for link in extract_links(html, url):
+                        if not is_internal(urlparse(link).netloc, base_netloc):
+                            continue
+                        normalized = link.rstrip("/")
+                        if normalized not in enqueued and normalized not in visited:
+                            enqueued.add(normalized)
+                            if await robots_allowed_async(session, normalized, HEADERS, limiter):
+                                q.append(normalized)
+
+                    # If URL looks like an article page, parse & save
+                    if _ARTICLE_RE.search(urlparse(url).path):
+                        norm = url.rstrip("/")
+                        if norm not in articles and len(articles) < MAX_RECORDS:
+                            try:
+                                soup = BeautifulSoup(html, "lxml")
+                                # same article served under another URL (slash, query string, mirror)
+                                dig = content_digest(soup)
+                                if dig in seen_digests:
+                                    logger.info("Skipping duplicate content: %s", url)
+                                    continue
+                                seen_digests.add(dig)
+                                row = parse_article(soup, url)
+                                scraped_rows.append(row)
+                                articles.add(norm)
+                                logger.info("Collected article: %s", row["title"][:120])
+                            except Exception as e:
+                                logger.warning("Failed parse article %s : %s", url, e)
+
+                    # Save periodically to disk (every 10 found)
+                    if len(scraped_rows) >= 10:
+                        append_csv(scraped_rows, out_path)
+                        scraped_rows = []
+    finally:
+        # always shut Chromium down, even if the crawl loop raised
+        await js.close()
 
     # final flush
     if scraped_rows:
@@ -199,5 +254,8 @@ def main():
     logger.info("Crawl complete. Total articles collected (including existing): %d", len(articles))
     logger.info("Saved/updated CSV: %s", out_path)
 
+def main():
+    asyncio.run(crawl())
+
 if __name__ == "__main__":
     main()
@@ -1,5 +1,6 @@
 # show_all_embeddings.py
 import os
+from bson.binary import Binary
 from pymongo import MongoClient
 
 PREVIEW_DIMS = 10  # number of initial vector dims to show
@@ -10,7 +11,14 @@ def main():
     client = MongoClient(os.environ["MONGODB_URI"])
     coll = client["scrape_db"]["history_pages"]
 
-    cursor = coll.find({}, {"title":1, "ai_summary_embedding":1})
+    # only ship the preview dims (plus the array length) instead of whole vectors;
+    # binData float32 vectors aren't arrays, so they come back whole and are sized client-side
+    projection = {
+        "title": 1,
+        "ai_summary_embedding": {"$slice": PREVIEW_DIMS},
+        "embedding_len": {"$cond": [{"$isArray": "$ai_summary_embedding"}, {"$size": "$ai_summary_embedding"}, None]},
+    }
+    cursor = coll.find({}, projection).batch_size(1000)
     count = 0
     for d in cursor:
         title = d.get("title","<no title>")
@@ -18,8 +26,10 @@ def main():
         if emb is None:
             print(f"{title} -> no embedding")
             continue
+        if isinstance(emb, Binary):
+            emb = emb.as_vector().data
         print(f"Title: {title}")
-        print("Embedding length:", len(emb))
+        print("Embedding length:", d.get("embedding_len") or len(emb))
         preview = emb[:PREVIEW_DIMS]
         print("First", PREVIEW_DIMS, "dims:", preview)
         print("-"*70)
@@ -12,18 +12,20 @@ Usage:
 """
 import os
 import csv
-import json
+import orjson
 import logging
 from pathlib import Path
 import certifi
 import pymongo
-from pymongo import MongoClient
+from pymongo import MongoClient, UpdateOne
+from pymongo.errors import OperationFailure
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
 
 MONGO_URI = os.environ.get("MONGO_URI")
 CSV_PATH = Path("output_with_summaries.csv")
 FALLBACK = Path("db_fallback.jsonl")
+BATCH_SIZE = 1000
 
 def show_tls_info():
     import ssl, sys
@@ -31,35 +33,42 @@ def show_tls_info():
     logging.info("OpenSSL: %s", ssl.OPENSSL_VERSION)
     logging.info("certifi bundle: %s", certifi.where())
 
-def load_rows(csv_path):
-    if not csv_path.exists():
-        logging.error("CSV not found: %s", csv_path)
-        return []
-    rows = []
+def iter_rows(csv_path):
+    """Stream CSV rows as dicts; nothing is held in memory beyond the current row."""
     with csv_path.open("r", encoding="utf-8") as f:
-        reader = csv.DictReader(f)
-        for r in reader:
-            rows.append(r)
-    logging.info("Loaded %d records from %s", len(rows), csv_path)
-    return rows
+        yield from csv.DictReader(f)
 
 def save_fallback(rows, fallback_path=FALLBACK):
-    logging.warning("Saving %d records to fallback file: %s", len(rows), fallback_path)
-    with fallback_path.open("w", encoding="utf-8") as out:
+    logging.warning("Saving records to fallback file: %s", fallback_path)
+    count = 0
+    # orjson emits UTF-8 bytes directly; the buffered binary writer batches the syscalls
+    with fallback_path.open("wb") as out:
         for r in rows:
-            out.write(json.dumps(r, ensure_ascii=False) + "\n")
-    logging.info("Fallback save complete.")
+            out.write(orjson.dumps(r) + b"\n")
+            count += 1
+    logging.info("Fallback save complete (%d records).", count)
 
 def upsert_to_mongo(rows, client):
     db = client.get_database("scrape_db")
     col = db["history_pages"]
+    # unique index keeps the url upsert filter an index lookup server-side
+    try:
+        col.create_index("url", unique=True, background=True)
+    except OperationFailure as e:
+        # e.g. duplicate urls already stored (DuplicateKeyError); the upsert still works, just unindexed
+        logging.error("Could not create unique index on %s.url, continuing without it: %s", col.name, e)
     count = 0
+    ops = []
     for r in rows:
         # you can adjust the upsert key
-        filter_doc = {"url": r.get("url")}
-        update_doc = {"$set": r}
-        col.update_one(filter_doc, update_doc, upsert=True)
-        count += 1
+        ops.append(UpdateOne({"url": r.get("url")}, {"$set": r}, upsert=True))
+        if len(ops) >= BATCH_SIZE:
+            col.bulk_write(ops, ordered=False)
+            count += len(ops)
+            ops = []
+    if ops:
+        col.bulk_write(ops, ordered=False)
+        count += len(ops)
     logging.info("Upserted %d records to %s.%s", count, db.name, col.name)
 
 def main():
@@ -69,8 +78,8 @@ def main():
 
     show_tls_info()
 
-    rows = load_rows(CSV_PATH)
-    if not rows:
+    if not CSV_PATH.exists():
+        logging.error("CSV not found: %s", CSV_PATH)
         return
 
     allow_invalid = os.environ.get("ALLOW_INVALID_TLS", "") in ("1", "true", "True")
@@ -91,11 +100,11 @@ def main():
         logging.info("Pinging server...")
         client.admin.command("ping")
         logging.info("Ping succeeded — proceeding to upsert.")
-        upsert_to_mongo(rows, client)
+        upsert_to_mongo(iter_rows(CSV_PATH), client)
         logging.info("All done.")
     except Exception as e:
         logging.exception("MongoDB connection failed (exception): %s", e)
-        save_fallback(rows)
+        save_fallback(iter_rows(CSV_PATH))
         logging.info("Records saved locally. Fix TLS / network and re-run importer (import_fallback.py).")
 
 if __name__ == "__main__":
@@ -1,19 +1,27 @@
 # summarizer.py
 """
 Reads SUM_INPUT_CSV, generates ai_summary for each row using OpenAI,
-writes SUM_OUTPUT_CSV. Resumable: if output exists it merges existing ai_summary.
+appends each finished row to SUM_OUTPUT_CSV as it completes. Resumable: urls already
+summarized in the output CSV are skipped.
 Config via .env
+
+  python summarizer.py          # concurrent chat completions (interactive / small runs)
+  python summarizer.py --batch  # OpenAI Batch API: one uploaded JSONL, ~50% cheaper, done within 24h
 """
 
 import os
+import csv
+import json
+import asyncio
 import time
+import argparse
 import logging
 from pathlib import Path
 from dotenv import load_dotenv
 import pandas as pd
 from tqdm import tqdm
 
-from openai import OpenAI, APIError, RateLimitError, APITimeoutError, InternalServerError
+from openai import OpenAI, AsyncOpenAI, APIError, RateLimitError, APITimeoutError, InternalServerError
 
 load_dotenv()
 
@@ -27,12 +35,17 @@ MAX_RETRIES = int(os.getenv("SUM_MAX_RETRIES", "6"))
 INITIAL_BACKOFF = float(os.getenv("SUM_BACKOFF_INITIAL", "1.0"))
 MAX_TOKENS = int(os.getenv("SUM_MAX_TOKENS", "120"))
 TEMPERATURE = float(os.getenv("SUM_TEMPERATURE", "0.2"))
-DELAY_BETWEEN_CALLS = float(os.getenv("SUM_DELAY", "0.2"))
+CONCURRENCY = int(os.getenv("SUM_CONCURRENCY", "20"))  # in-flight OpenAI requests
+BATCH_POLL_SECONDS = float(os.getenv("SUM_BATCH_POLL", "60"))
+# Batch API caps each input file at 50,000 requests / 200 MB; stay a little under the size cap
+BATCH_MAX_REQUESTS = int(os.getenv("SUM_BATCH_MAX_REQUESTS", "50000"))
+BATCH_MAX_BYTES = int(os.getenv("SUM_BATCH_MAX_BYTES", str(190 * 1024 * 1024)))
 
 if not OPENAI_API_KEY:
     raise SystemExit("OPENAI_API_KEY is not set (put it in .env or environment)")
 
 client = OpenAI(api_key=OPENAI_API_KEY)
+aclient = AsyncOpenAI(api_key=OPENAI_API_KEY)
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
 logger = logging.getLogger("summarizer")
@@ -62,11 +75,11 @@ def build_messages(row):
     ]
 
 
-def call_openai(messages, retries=MAX_RETRIES):
+async def call_openai(messages, retries=MAX_RETRIES):
     backoff = INITIAL_BACKOFF
     for attempt in range(1, retries + 1):
         try:
-            resp = client.chat.completions.create(
+            resp = await aclient.chat.completions.create(
                 model=MODEL,
                 messages=messages,
                 max_tokens=MAX_TOKENS,
@@ -79,46 +92,193 @@ def call_openai(messages, retries=MAX_RETRIES):
                 return ""
             sleep = backoff * (2 ** (attempt - 1))
             logger.warning("OpenAI error, retrying in %.1fs (%s)", sleep, e)
-            time.sleep(sleep)
+            await asyncio.sleep(sleep)
         except Exception as e:
             logger.exception("Unexpected OpenAI error: %s", e)
             return ""
 
 
-def main():
+async def summarize_one(sem, idx, row):
+    async with sem:
+        return idx, row["url"], await call_openai(build_messages(row))
+
+
+def write_row(writer, df, idx, summary):
+    row = df.loc[idx].to_dict()
+    row["ai_summary"] = summary
+    writer.writerow(row)
+
+
+async def summarize_all(df, todo, writer, out_fh):
+    """Summarize df rows in todo concurrently; append each result to the output CSV as it completes."""
+    sem = asyncio.Semaphore(CONCURRENCY)
+    tasks = [summarize_one(sem, idx, df.loc[idx].to_dict()) for idx in todo]
+    for n, fut in enumerate(tqdm(asyncio.as_completed(tasks), total=len(tasks), desc="Summarizing"), 1):
+        idx, url, summary = await fut
+        # failed rows are left out so the next run retries them
+        if summary:
+            write_row(writer, df, idx, summary)
+        if n % SAVE_EVERY == 0 or n == len(tasks):
+            out_fh.flush()
+            logger.info("Saved progress to %s (%d/%d)", out_fh.name, n, len(tasks))
+
+
+def write_batch_files(df, todo, output_path):
+    """Write one /v1/chat/completions request per url, split into files under the Batch API limits."""
+    paths, lines, size = [], [], 0
+
+    def flush():
+        path = output_path.with_suffix(f".batch_input.{len(paths)}.jsonl")
+        path.write_bytes(b"".join(lines))
+        paths.append(path)
+
+    for idx in todo:
+        req = {
+            "custom_id": df.at[idx, "url"],
+            "method": "POST",
+            "url": "/v1/chat/completions",
+            "body": {
+                "model": MODEL,
+                "messages": build_messages(df.loc[idx].to_dict()),
+                "max_tokens": MAX_TOKENS,
+                "temperature": TEMPERATURE,
+            },
+        }
+        line = (json.dumps(req, ensure_ascii=False) + "\n").encode("utf-8")
+        if lines and (len(lines) >= BATCH_MAX_REQUESTS or size + len(line) > BATCH_MAX_BYTES):
+            flush()
+            lines, size = [], 0
+        lines.append(line)
+        size += len(line)
+    if lines:
+        flush()
+    return paths
+
+
+def collect_batches(batch_ids, df, todo, writer, out_fh):
+    """Poll each batch until it finishes and append its summaries; returns the urls that got one."""
+    rows_by_url = {}
+    for idx in todo:
+        rows_by_url.setdefault(df.at[idx, "url"], []).append(idx)
+
+    got = set()
+    for batch_id in batch_ids:
+        batch = client.batches.retrieve(batch_id)
+        while batch.status not in ("completed", "failed", "expired", "cancelled"):
+            time.sleep(BATCH_POLL_SECONDS)
+            batch = client.batches.retrieve(batch_id)
+            logger.info("Batch %s: %s (%s)", batch_id, batch.status, batch.request_counts)
+
+        if not batch.output_file_id:
+            logger.error("Batch %s ended with status %s and no output", batch_id, batch.status)
+            continue
+
+        for line in client.files.content(batch.output_file_id).text.splitlines():
+            if not line.strip():
+                continue
+            rec = json.loads(line)
+            body = (rec.get("response") or {}).get("body") or {}
+            choices = body.get("choices") or []
+            url = rec["custom_id"]
+            if choices and url in rows_by_url:
+                summary = choices[0]["message"]["content"].strip()
+                for idx in rows_by_url[url]:
+                    write_row(writer, df, idx, summary)
+                got.add(url)
+        out_fh.flush()
+
+    failed = len(rows_by_url) - len(got)
+    if failed:
+        logger.warning("%d urls returned no summary from the batch run", failed)
+    return got
+
+
+def run_batch(df, todo, writer, out_fh, output_path):
+    """Summarize df rows in todo through the OpenAI Batch API; blocks until every batch finishes.
+
+    Submitted batch ids are kept in <output>.batch_id, so an interrupted run resumes polling them
+    instead of submitting (and paying for) the same requests again.
+    """
+    state_path = output_path.with_suffix(".batch_id")
+
+    # custom_id is the url, which is also what resume keys on
+    blank = [idx for idx in todo if not df.at[idx, "url"]]
+    if blank:
+        logger.warning("Skipping %d rows without a url in batch mode", len(blank))
+        todo = [idx for idx in todo if df.at[idx, "url"]]
+
+    if state_path.exists():
+        batch_ids = state_path.read_text(encoding="utf-8").split()
+        logger.info("Resuming %d batch(es) from %s", len(batch_ids), state_path)
+        got = collect_batches(batch_ids, df, todo, writer, out_fh)
+        state_path.unlink()
+        todo = [idx for idx in todo if df.at[idx, "url"] not in got]
+
+    if not todo:
+        return
+
+    # one request per url; duplicate rows share the summary
+    first_rows = {}
+    for idx in todo:
+        first_rows.setdefault(df.at[idx, "url"], idx)
+    batch_ids = []
+    for path in write_batch_files(df, list(first_rows.values()), output_path):
+        with path.open("rb") as fh:
+            input_file = client.files.create(file=fh, purpose="batch")
+        batch = client.batches.create(
+            input_file_id=input_file.id, endpoint="/v1/chat/completions", completion_window="24h"
+        )
+        batch_ids.append(batch.id)
+        with state_path.open("a", encoding="utf-8") as fh:
+            fh.write(batch.id + "\n")
+        logger.info("Submitted batch %s from %s", batch.id, path)
+
+    collect_batches(batch_ids, df, todo, writer, out_fh)
+    state_path.unlink()
+
+
+def main(use_batch=False):
     input_path = Path(INPUT_CSV)
     output_path = Path(OUTPUT_CSV)
     if not input_path.exists():
         raise SystemExit(f"Input CSV not found: {input_path.resolve()}")
 
     df = pd.read_csv(input_path, dtype=str).fillna("")
+    fieldnames = [c for c in df.columns if c != "ai_summary"] + ["ai_summary"]
 
-    # If output exists, merge existing ai_summary
-    if output_path.exists():
+    # resume: urls already in the output CSV are done
+    done = {}
+    if output_path.exists() and output_path.stat().st_size:
         out_df = pd.read_csv(output_path, dtype=str).fillna("")
-        if "ai_summary" in out_df.columns:
-            df = df.merge(out_df[["url", "ai_summary"]], on="url", how="left")
-    else:
-        df["ai_summary"] = ""
+        if "ai_summary" not in out_df.columns:
+            raise SystemExit(f"{output_path} has no ai_summary column; move it aside or set SUM_OUTPUT_CSV")
+        kept = out_df[out_df["ai_summary"].ne("")]
+        done = dict(zip(kept["url"], kept["ai_summary"]))
+        if len(kept) < len(out_df):
+            # full snapshot from an older run: drop unsummarized rows so appends don't duplicate them
+            kept.to_csv(output_path, index=False)
+        fieldnames = list(out_df.columns)
 
-    total = len(df)
-    logger.info("Rows to process: %d", total)
+    df["ai_summary"] = df["url"].map(done).fillna("")
+    todo = df.index[df["ai_summary"].eq("")].tolist()
+    logger.info("Rows to process: %d (of %d)", len(todo), len(df))
+
+    new_file = not (output_path.exists() and output_path.stat().st_size)
+    with output_path.open("a", encoding="utf-8", newline="") as out_fh:
+        writer = csv.DictWriter(out_fh, fieldnames=fieldnames, extrasaction="ignore")
+        if new_file:
+            writer.writeheader()
+
+        if use_batch:
+            run_batch(df, todo, writer, out_fh, output_path)
+        else:
+            asyncio.run(summarize_all(df, todo, writer, out_fh))
 
-    for idx in tqdm(range(total), desc="Summarizing"):
-        if df.at[idx, "ai_summary"]:
-            continue
-        row = df.iloc[idx].to_dict()
-        messages = build_messages(row)
-        summary = call_openai(messages)
-        df.at[idx, "ai_summary"] = summary
-        time.sleep(DELAY_BETWEEN_CALLS)
-        if (idx + 1) % SAVE_EVERY == 0 or (idx + 1) == total:
-            df.to_csv(output_path, index=False)
-            logger.info("Saved progress to %s (%d/%d)", output_path, idx + 1, total)
-
-    df.to_csv(output_path, index=False)
     logger.info("All summaries complete → %s", output_path)
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Generate ai_summary for scraped rows with OpenAI")
+    parser.add_argument("--batch", action="store_true", help="Use the OpenAI Batch API (offline, cheaper)")
+    args = parser.parse_args()
+    main(use_batch=args.batch)
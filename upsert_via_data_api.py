@@ -1,5 +1,5 @@
 # upsert_via_data_api.py
-import json, pathlib, requests
+import orjson, pathlib, requests
 
 # adjust:
 API_URL = "https://data.mongodb-api.com/app/myapp-abcde/endpoint/data/v1/action/insertOne"
@@ -14,25 +14,36 @@ headers = {
     "api-key": API_KEY,
 }
 
-# read fallback jsonl lines
-docs = [json.loads(line) for line in open(CSV_JSONL, "r", encoding="utf-8") if line.strip()]
+# the Data API caps operations per request, so post the upserts in chunks
+MAX_OPS_PER_REQUEST = 100
 
-# build bulkWrite request body with upsert operations
-writes = []
-for d in docs:
-    writes.append({"updateOne": {
-        "filter": {"url": d.get("url")},
-        "update": {"$set": d},
-        "upsert": True
-    }})
+def post_writes(writes):
+    body = {
+        "dataSource": "Cluster0",   # typical default name; replace if different in your App config
+        "database": DATABASE,
+        "collection": COLLECTION,
+        "operations": writes
+    }
 
-body = {
-    "dataSource": "Cluster0",   # typical default name; replace if different in your App config
-    "database": DATABASE,
-    "collection": COLLECTION,
-    "operations": writes
-}
+    resp = requests.post(API_URL, headers=headers, json=body, timeout=120)
+    print(resp.status_code)
+    print(resp.text)
+
+# stream fallback jsonl lines and build upsert operations
+writes = []
+with open(CSV_JSONL, "rb") as fh:
+    for line in fh:
+        if not line.strip():
+            continue
+        d = orjson.loads(line)
+        writes.append({"updateOne": {
+            "filter": {"url": d.get("url")},
+            "update": {"$set": d},
+            "upsert": True
+        }})
+        if len(writes) >= MAX_OPS_PER_REQUEST:
+            post_writes(writes)
+            writes = []
 
-resp = requests.post(API_URL, headers=headers, json=body, timeout=120)
-print(resp.status_code)
-print(resp.text)
+if writes:
+    post_writes(writes)